@@ -1,36 +1,69 @@
+import asyncio
+import contextlib
+from datetime import date
+
 from dotenv import load_dotenv
 
 from livekit import agents, rtc
-from livekit.agents import AgentServer,AgentSession, Agent, room_io
+from livekit.agents import AgentServer,AgentSession, Agent, inference, room_io
 from livekit.plugins import noise_cancellation, silero, sarvam, elevenlabs
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
-from prompt import AGENT_INSTRUCTIONS, SESSION_INSTRUCTIONS
-from tools import list_accounts, fetch_balance, initiate_transfer, list_recent_transactions, list_loan_options, calculate_emi, get_user_name
+from prompt import SESSION_INSTRUCTIONS, get_agent_instructions
+from tools import aclose_client, bind_session_id, list_accounts, fetch_balance, initiate_transfer, list_recent_transactions, list_loan_options, calculate_emi, get_user_name
 
 load_dotenv(".env.local")
 
 class Assistant(Agent):
     def __init__(self) -> None:
         super().__init__(
-            instructions=AGENT_INSTRUCTIONS,
+            instructions=get_agent_instructions(date.today().isoformat()),
             tools=[list_accounts, fetch_balance, initiate_transfer, list_recent_transactions, list_loan_options, calculate_emi, get_user_name],
         )
 
+def prewarm(proc: agents.JobProcess):
+    # Load VAD weights once per worker process instead of on every call
+    proc.userdata["vad"] = silero.VAD.load()
+
+
 server = AgentServer()
+server.setup_fnc = prewarm
 
 @server.rtc_session()
 async def my_agent(ctx: agents.JobContext):
+    ctx.add_shutdown_callback(aclose_client)
+
+    tts = elevenlabs.TTS(
+        voice_id="RXe6OFmxoC0nlSWpuCDy",
+        model="eleven_flash_v2_5"
+    )
+    # Open the ElevenLabs websocket while the room connects so the greeting skips the handshake;
+    # the plugin then keeps it alive across turns
+    tts_warmup = asyncio.create_task(tts.current_connection())
+
+    # Resolve the user's session id before the session spawns its tool tasks so they inherit it
+    await ctx.connect()
+    await ctx.wait_for_participant()
+    bind_session_id()
+
     session = AgentSession(
         stt=sarvam.STT(
             model="saarika:v2.5",
         ),
-        llm="openai/gpt-4.1-mini",
-        tts=elevenlabs.TTS(
-            voice_id="RXe6OFmxoC0nlSWpuCDy",
-            model="eleven_flash_v2_5"
+        # Tool calls from one completion already run as concurrent tasks; make sure the
+        # model is allowed to batch independent lookups into a single completion
+        llm=inference.LLM(
+            model="openai/gpt-4.1-mini",
+            extra_kwargs={"parallel_tool_calls": True},
         ),
-        vad=silero.VAD.load(),
+        tts=tts,
+        vad=ctx.proc.userdata["vad"],
+        # Cheap to construct: inference runs in the worker's shared executor, which loads the weights once
         turn_detection=MultilingualModel(),
+        # Sarvam has no endpointing knob, so cap how long the turn detector may hold
+        # short replies like "haan"/"yes" and start the LLM on the transcript early
+        min_endpointing_delay=0.4,
+        max_endpointing_delay=1.5,
+        preemptive_generation=True,
         use_tts_aligned_transcript=True,
     )
 
@@ -44,6 +77,10 @@ async def my_agent(ctx: agents.JobContext):
         ),
     )
 
+    with contextlib.suppress(Exception):
+        # a failed warmup is retried on first synthesis
+        await tts_warmup
+
     await session.generate_reply(
         instructions=SESSION_INSTRUCTIONS
     )
@@ -1,15 +1,25 @@
 from __future__ import annotations
 
+import asyncio
 import os
 import uuid
-from datetime import datetime, timedelta
+import weakref
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import Literal, Any
 import logging
 import bcrypt
-
-from fastapi import Depends, FastAPI, HTTPException, Request, status
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from pydantic import BaseModel, Field
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from cachetools import TTLCache
+
+from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, Request, Response, status
+from fastapi.responses import ORJSONResponse
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorClientSession, AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import OperationFailure, PyMongoError
+from pydantic import BaseModel, Field, TypeAdapter
 from dotenv import load_dotenv
 
 load_dotenv(".env.local")
@@ -19,13 +29,13 @@ logging.basicConfig(
     format="%(asctime)s %(levelname)s %(name)s %(message)s",
 )
 logger = logging.getLogger("bank_api")
-app = FastAPI(title="Voice Banking Backend", version="0.1.0")
 
 
 class Settings(BaseModel):
     mongodb_uri: str = Field(default_factory=lambda: os.environ["MONGODB_URI"])
     mongodb_db: str = Field(default_factory=lambda: os.environ.get("MONGODB_DB", "voicebank"))
     session_ttl_minutes: int = 60 * 24
+    bcrypt_cost: int = Field(default_factory=lambda: int(os.environ.get("BCRYPT_COST", "12")))
 
 
 settings = Settings()
@@ -102,7 +112,18 @@ class TransactionOut(BaseModel):
     balance_after: float | None = None
 
 
+# List endpoints validate and serialize in one pass instead of FastAPI's model -> re-validate -> encode
+_accounts_adapter = TypeAdapter(list[AccountOut])
+_transactions_adapter = TypeAdapter(list[TransactionOut])
+
+
 # ---------- Utilities ----------
+# Projections for hot queries: never ship hashes or _id back from Mongo unless needed
+_ACCOUNT_OUT_PROJECTION = {"_id": 0, "transaction_pin_hash": 0}
+_TRANSACTION_OUT_PROJECTION = {"_id": 0, "customer_id": 0}
+_CUSTOMER_OUT_PROJECTION = {"_id": 0, "customer_id": 1, "name": 1, "account_numbers": 1}
+
+
 async def get_db(request: Request) -> AsyncIOMotorDatabase:
     db = getattr(request.app.state, "db", None)
     if db is None:
@@ -110,69 +131,276 @@ async def get_db(request: Request) -> AsyncIOMotorDatabase:
     return db
 
 
-def hash_password(raw: str) -> str:
+def get_now() -> datetime:
+    """Request-scoped UTC timestamp; FastAPI caches dependencies per request, so every dependant shares one clock read."""
+    return datetime.now(timezone.utc)
+
+
+# bcrypt and argon2 release the GIL while hashing, so a thread pool keeps the event
+# loop free and still spreads work across cores without process start-up costs.
+hash_pool = ThreadPoolExecutor(max_workers=(os.cpu_count() or 1) * 2, thread_name_prefix="hash")
+_hash_slots = asyncio.Semaphore(500)
+
+# Transaction PINs use argon2id. Account passwords stay on bcrypt because the
+# Next.js auth routes verify the same users.password_hash with bcryptjs.
+_pin_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=1)
+# Every argon2 call holds 64 MiB, so cap them at about one per core across all API workers
+# rather than letting the whole hash pool run them (2x CPU threads in each worker).
+_api_workers = max(1, int(os.environ.get("BANK_API_WORKERS", "1")))
+_pin_slots = asyncio.Semaphore(max(1, (os.cpu_count() or 1) // _api_workers))
+
+
+async def _run_hasher(fn, *args):
+    """Run a hashing call off the event loop; shed load with 503 once the queue is full."""
+    if _hash_slots.locked():
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            "Server busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+    async with _hash_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(hash_pool, fn, *args)
+
+
+def _hashpw(raw: str) -> str:
     raw_bytes = raw.encode("utf-8")
-    hashed = bcrypt.hashpw(raw_bytes, bcrypt.gensalt())
+    hashed = bcrypt.hashpw(raw_bytes, bcrypt.gensalt(rounds=settings.bcrypt_cost))
     return hashed.decode("utf-8")
 
 
-def verify_password(raw: str, hashed: str) -> bool:
+def _checkpw(raw: str, hashed: str) -> bool:
     try:
         return bcrypt.checkpw(raw.encode("utf-8"), hashed.encode("utf-8"))
     except Exception:
         return False
 
 
+def _check_pin(raw: str, hashed: str) -> bool:
+    if hashed.startswith("$2"):
+        # Legacy bcrypt PIN hash; upgraded on the next successful transfer
+        return _checkpw(raw, hashed)
+    try:
+        return _pin_hasher.verify(hashed, raw)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+async def hash_password(raw: str) -> str:
+    return await _run_hasher(_hashpw, raw)
+
+
+async def verify_password(raw: str, hashed: str) -> bool:
+    return await _run_hasher(_checkpw, raw, hashed)
+
+
+async def hash_pin(raw: str) -> str:
+    async with _pin_slots:
+        return await _run_hasher(_pin_hasher.hash, raw)
+
+
+async def verify_pin(raw: str, hashed: str) -> bool:
+    async with _pin_slots:
+        return await _run_hasher(_check_pin, raw, hashed)
+
+
+def pin_needs_rehash(hashed: str) -> bool:
+    return hashed.startswith("$2") or _pin_hasher.check_needs_rehash(hashed)
+
+
+async def _upgrade_pin_hash(db: AsyncIOMotorDatabase, account_number: str, old_hash: str, raw: str) -> None:
+    try:
+        # Match on the old hash so a concurrent PIN change is never overwritten
+        await db.accounts.update_one(
+            {"account_number": account_number, "transaction_pin_hash": old_hash},
+            {"$set": {"transaction_pin_hash": await hash_pin(raw)}},
+        )
+    except Exception:
+        logger.exception("Failed to upgrade PIN hash for account %s", account_number[-4:])
+
+
+# Per-process cache of validated sessions: session_id -> (user_doc, expires_at).
+# Logout (here or in the Next.js route) only flips sessions.active in Mongo and can't
+# reach other workers, so keep the window short; write routes re-check via require_live_session.
+_session_cache: TTLCache[str, tuple[dict, datetime]] = TTLCache(maxsize=10_000, ttl=5)
+_session_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+# Customer doc + accounts prefetched with the session: customer_id -> {"customer", "accounts"}.
+# Dropped for every customer a write touches; the short TTL bounds staleness across workers.
+_customer_cache: TTLCache[str, dict] = TTLCache(maxsize=10_000, ttl=30)
+
+
+def _cached_session_user(session_id: str, now: datetime) -> dict | None:
+    cached = _session_cache.get(session_id)
+    if cached and cached[1] > now:
+        return cached[0]
+    return None
+
+
 async def require_session(
-    request: Request, db: AsyncIOMotorDatabase = Depends(get_db)
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    now: datetime = Depends(get_now),
 ) -> dict:
     session_id = request.headers.get("X-Session-Id")
     if not session_id:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Missing session id")
 
-    session = await db.sessions.find_one(
-        {"session_id": session_id, "active": True, "expires_at": {"$gt": datetime.utcnow()}}
-    )
-    if not session:
-        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid or expired session")
+    request.state.session_id = session_id
+    request.state.session_from_cache = True
+    if (user := _cached_session_user(session_id, now)) is not None:
+        return user
+
+    # Coalesce concurrent misses for the same session into a single lookup
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    async with lock:
+        if (user := _cached_session_user(session_id, now)) is not None:
+            return user
+
+        request.state.session_from_cache = False
+        # Resolve the session, its user, and the user's customer + accounts in a single
+        # round-trip so the tool calls that follow can be served from memory
+        docs = await db.sessions.aggregate(
+            [
+                {"$match": {"session_id": session_id, "active": True}},
+                {"$limit": 1},
+                {
+                    "$lookup": {
+                        "from": "users",
+                        "localField": "user_id",
+                        "foreignField": "user_id",
+                        "as": "user",
+                    }
+                },
+                {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}},
+                {
+                    "$lookup": {
+                        "from": "customers",
+                        "localField": "user.customer_id",
+                        "foreignField": "customer_id",
+                        "as": "customer",
+                    }
+                },
+                {"$unwind": {"path": "$customer", "preserveNullAndEmptyArrays": True}},
+                {
+                    "$lookup": {
+                        "from": "accounts",
+                        "localField": "customer.account_numbers",
+                        "foreignField": "account_number",
+                        "as": "accounts",
+                    }
+                },
+                {
+                    "$project": {
+                        "_id": 0,
+                        "expires_at": 1,
+                        "user.user_id": 1,
+                        "user.customer_id": 1,
+                        "user.name": 1,
+                        "customer.customer_id": 1,
+                        "customer.name": 1,
+                        "customer.account_numbers": 1,
+                        "accounts.account_number": 1,
+                        "accounts.nickname": 1,
+                        "accounts.account_type": 1,
+                        "accounts.balance": 1,
+                        "accounts.customer_id": 1,
+                    }
+                },
+            ]
+        ).to_list(length=1)
+        if not docs:
+            raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid or expired session")
+
+        session = docs[0]
+        # The TTL monitor only sweeps about once a minute, so guard the gap here
+        if session["expires_at"] <= now:
+            raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid or expired session")
+
+        user = session.get("user")
+        if not user:
+            raise HTTPException(status.HTTP_401_UNAUTHORIZED, "User not found for session")
+
+        _session_cache[session_id] = (user, session["expires_at"])
+        if customer := session.get("customer"):
+            _customer_cache[user["customer_id"]] = {
+                "customer": customer,
+                "accounts": session.get("accounts", []),
+            }
+    return user
 
-    user = await db.users.find_one({"user_id": session["user_id"]})
-    if not user:
-        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "User not found for session")
 
-    request.state.session_id = session_id
+async def require_live_session(
+    request: Request,
+    user: dict = Depends(require_session),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    now: datetime = Depends(get_now),
+) -> dict:
+    """For routes that move money: a cached session is re-checked in Mongo so a logout takes effect at once."""
+    if request.state.session_from_cache:
+        session_id = request.state.session_id
+        live = await db.sessions.find_one(
+            {"session_id": session_id, "active": True, "expires_at": {"$gt": now}}, {"_id": 1}
+        )
+        if not live:
+            _session_cache.pop(session_id, None)
+            raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid or expired session")
     return user
 
 
 # ---------- Lifecycle ----------
-@app.on_event("startup")
-async def startup() -> None:
-    app.state.mongo_client = AsyncIOMotorClient(settings.mongodb_uri)
-    app.state.db = app.state.mongo_client[settings.mongodb_db]
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # tz_aware keeps datetimes read back from Mongo comparable with aware UTC "now"
+    client = AsyncIOMotorClient(
+        settings.mongodb_uri,
+        tz_aware=True,
+        minPoolSize=10,
+        maxPoolSize=50,
+        maxIdleTimeMS=60_000,
+        serverSelectionTimeoutMS=2_000,
+        waitQueueTimeoutMS=1_000,
+    )
+    app.state.mongo_client = client
+    app.state.db = client[settings.mongodb_db]
+    # Open a connection now so the first user request doesn't pay the handshake
+    await app.state.db.command("ping")
     await ensure_indexes(app.state.db)
     # Uncomment to seed demo data locally
     # await seed_sample_data(app.state.db)
     logger.info("Connected to MongoDB, ensured indexes, and seeded data")
-
-
-@app.on_event("shutdown")
-async def shutdown() -> None:
-    if client := getattr(app.state, "mongo_client", None):
+    try:
+        yield
+    finally:
         client.close()
         logger.info("Closed MongoDB client")
+        hash_pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(
+    title="Voice Banking Backend",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 
 async def ensure_indexes(db: AsyncIOMotorDatabase) -> None:
     """Create key indexes and uniqueness constraints."""
-    await db.users.create_index("user_id", unique=True)
-    await db.customers.create_index("customer_id", unique=True)
-    await db.accounts.create_index("account_number", unique=True)
-    await db.transactions.create_index(
-        [("account_number", 1), ("created_at", -1)], name="account_createdAt"
-    )
-    await db.sessions.create_index(
-        [("session_id", 1), ("active", 1), ("expires_at", 1)],
-        name="session_validity",
+    await asyncio.gather(
+        db.users.create_index("user_id", unique=True),
+        db.customers.create_index("customer_id", unique=True),
+        db.accounts.create_index("account_number", unique=True),
+        db.transactions.create_index(
+            [("account_number", 1), ("created_at", -1)], name="account_createdAt"
+        ),
+        db.sessions.create_index(
+            [("session_id", 1), ("active", 1), ("expires_at", 1)],
+            name="session_validity",
+        ),
+        # Let MongoDB evict sessions as soon as they expire
+        db.sessions.create_index("expires_at", expireAfterSeconds=0, name="session_expiry_ttl"),
     )
 
 
@@ -180,6 +408,8 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
     """Insert richer mock data for testing (users, customers, accounts)."""
     seed_password = "P@ssword123"
     # Transaction PINs: Srinjoy 0001, Sujal 0002, Mariam 0003, Bibhuti 0004
+    seed_tpins = ("0001", "0002", "0003", "0004")
+    tpin_hashes = dict(zip(seed_tpins, await asyncio.gather(*(hash_pin(p) for p in seed_tpins))))
     # seed_users = [
     #     {"user_id": "srinjoy", "name": "Srinjoy Dutta", "customer_id": "cust_1001"},
     #     {"user_id": "sujal", "name": "Sujal Kyal", "customer_id": "cust_1002"},
@@ -218,7 +448,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
             "account_type": "Salary",
             "balance": 125000.25,
             "customer_id": "cust_1001",
-            "transaction_pin_hash": hash_password("0001"),
+            "transaction_pin_hash": tpin_hashes["0001"],
         },
         {
             "account_number": "11113333",
@@ -226,7 +456,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
             "account_type": "Savings",
             "balance": 45230.80,
             "customer_id": "cust_1001",
-            "transaction_pin_hash": hash_password("0001"),
+            "transaction_pin_hash": tpin_hashes["0001"],
         },
         # Sujal: current only
         {
@@ -235,7 +465,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
             "account_type": "Current",
             "balance": 802345.10,
             "customer_id": "cust_1002",
-            "transaction_pin_hash": hash_password("0002"),
+            "transaction_pin_hash": tpin_hashes["0002"],
         },
         # Mariam: salary + savings + current
         {
@@ -244,7 +474,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
             "account_type": "Salary",
             "balance": 98765.43,
             "customer_id": "cust_1003",
-            "transaction_pin_hash": hash_password("0003"),
+            "transaction_pin_hash": tpin_hashes["0003"],
         },
         {
             "account_number": "33335555",
@@ -252,7 +482,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
             "account_type": "Savings",
             "balance": 1500000.00,
             "customer_id": "cust_1003",
-            "transaction_pin_hash": hash_password("0003"),
+            "transaction_pin_hash": tpin_hashes["0003"],
         },
         {
             "account_number": "33336666",
@@ -260,7 +490,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
             "account_type": "Current",
             "balance": 30500.75,
             "customer_id": "cust_1003",
-            "transaction_pin_hash": hash_password("0003"),
+            "transaction_pin_hash": tpin_hashes["0003"],
         },
         # Bibhuti: current
         {
@@ -269,7 +499,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
             "account_type": "Current",
             "balance": 210450.60,
             "customer_id": "cust_1004",
-            "transaction_pin_hash": hash_password("0004"),
+            "transaction_pin_hash": tpin_hashes["0004"],
         },
     ]
     # seed_transactions = [
@@ -282,7 +512,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
     #         "counterparty": "Acme Corp",
     #         "counterparty_account": "99XX1234",
     #         "description": "Monthly salary",
-    #         "created_at": datetime.utcnow(),
+    #         "created_at": datetime.now(timezone.utc),
     #         "balance_after": 125000.25,
     #     },
     #     {
@@ -293,7 +523,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
     #         "counterparty": "MetroMart",
     #         "counterparty_account": None,
     #         "description": "Groceries",
-    #         "created_at": datetime.utcnow(),
+    #         "created_at": datetime.now(timezone.utc),
     #         "balance_after": 123500.25,
     #     },
     #     {
@@ -304,7 +534,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
     #         "counterparty": "FD Interest",
     #         "counterparty_account": None,
     #         "description": "Interest payout",
-    #         "created_at": datetime.utcnow(),
+    #         "created_at": datetime.now(timezone.utc),
     #         "balance_after": 45230.80,
     #     },
     #     # Sujal
@@ -316,7 +546,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
     #         "counterparty": "VendorPay",
     #         "counterparty_account": "77XX9988",
     #         "description": "Supplier payment",
-    #         "created_at": datetime.utcnow(),
+    #         "created_at": datetime.now(timezone.utc),
     #         "balance_after": 777345.10,
     #     },
     #     {
@@ -327,7 +557,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
     #         "counterparty": "Client ABC",
     #         "counterparty_account": "66XX4455",
     #         "description": "Invoice payout",
-    #         "created_at": datetime.utcnow(),
+    #         "created_at": datetime.now(timezone.utc),
     #         "balance_after": 802345.10,
     #     },
     #     # Mariam
@@ -339,7 +569,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
     #         "counterparty": "Mutual Fund",
     #         "counterparty_account": None,
     #         "description": "Investment SIP",
-    #         "created_at": datetime.utcnow(),
+    #         "created_at": datetime.now(timezone.utc),
     #         "balance_after": 1450000.00,
     #     },
     #     {
@@ -350,7 +580,7 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
     #         "counterparty": "Acme Corp",
     #         "counterparty_account": "99XX1234",
     #         "description": "Payroll",
-    #         "created_at": datetime.utcnow(),
+    #         "created_at": datetime.now(timezone.utc),
     #         "balance_after": 98765.43,
     #     },
     #     # Bibhuti
@@ -362,27 +592,39 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
     #         "counterparty": "Courier Express",
     #         "counterparty_account": None,
     #         "description": "Logistics",
-    #         "created_at": datetime.utcnow(),
+    #         "created_at": datetime.now(timezone.utc),
     #         "balance_after": 195450.60,
     #     },
     # ]
 
-    for cust in seed_customers.values():
-        existing = await db.customers.find_one({"customer_id": cust["customer_id"]})
-        if not existing:
-            await db.customers.insert_one(cust)
-            logger.info("Inserted sample customer %s", cust["customer_id"])
-
-    for acct in seed_accounts:
-        acct_existing = await db.accounts.find_one({"account_number": acct["account_number"]})
-        if not acct_existing:
-            await db.accounts.insert_one(acct)
-            logger.info("Inserted sample account %s", acct["account_number"])
-        await db.customers.update_one(
+    customer_ops = [
+        UpdateOne({"customer_id": cust["customer_id"]}, {"$setOnInsert": cust}, upsert=True)
+        for cust in seed_customers.values()
+    ]
+    account_ops = [
+        UpdateOne({"account_number": acct["account_number"]}, {"$setOnInsert": acct}, upsert=True)
+        for acct in seed_accounts
+    ]
+    customer_res, account_res = await asyncio.gather(
+        db.customers.bulk_write(customer_ops, ordered=False),
+        db.accounts.bulk_write(account_ops, ordered=False),
+    )
+    logger.info(
+        "Seeded %d customers and %d accounts",
+        customer_res.upserted_count,
+        account_res.upserted_count,
+    )
+
+    # Link accounts onto customers that existed before seeding
+    link_ops = [
+        UpdateOne(
             {"customer_id": acct["customer_id"]},
             {"$addToSet": {"account_numbers": acct["account_number"]}},
             upsert=True,
         )
+        for acct in seed_accounts
+    ]
+    await db.customers.bulk_write(link_ops, ordered=False)
 
     # for txn in seed_transactions:
     #     txn_existing = await db.transactions.find_one({"transaction_id": txn["transaction_id"]})
@@ -396,10 +638,10 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
     #         await db.users.insert_one(
     #             {
     #                 "user_id": user["user_id"],
-    #                 "password_hash": hash_password(seed_password),
+    #                 "password_hash": await hash_password(seed_password),
     #                 "name": user["name"],
     #                 "customer_id": user["customer_id"],
-    #                 "created_at": datetime.utcnow(),
+    #                 "created_at": datetime.now(timezone.utc),
     #             }
     #         )
     #         logger.info("Inserted sample user %s (customer %s)", user["user_id"], user["customer_id"])
@@ -409,26 +651,30 @@ async def seed_sample_data(db: AsyncIOMotorDatabase) -> None:
     #         await db.users.insert_one(
     #             {
     #                 "user_id": user["user_id"],
-    #                 "password_hash": hash_password(seed_password),
+    #                 "password_hash": await hash_password(seed_password),
     #                 "name": user["name"],
     #                 "customer_id": user["customer_id"],
-    #                 "created_at": datetime.utcnow(),
+    #                 "created_at": datetime.now(timezone.utc),
     #             }
     #         )
     #         logger.info("Inserted sample user %s (customer %s)", user["user_id"], user["customer_id"])
 
 # ---------- Auth routes ----------
 @app.post("/signup", response_model=dict, status_code=status.HTTP_201_CREATED)
-async def signup(payload: UserCreate, db: AsyncIOMotorDatabase = Depends(get_db)) -> dict:
+async def signup(
+    payload: UserCreate,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    now: datetime = Depends(get_now),
+) -> dict:
     if await db.users.find_one({"user_id": payload.user_id}):
         raise HTTPException(status.HTTP_409_CONFLICT, "User already exists")
 
     user_doc = {
         "user_id": payload.user_id,
-        "password_hash": hash_password(payload.password),
+        "password_hash": await hash_password(payload.password),
         "name": payload.name,
         "customer_id": payload.customer_id,
-        "created_at": datetime.utcnow(),
+        "created_at": now,
     }
     await db.users.insert_one(user_doc)
 
@@ -441,18 +687,22 @@ async def signup(payload: UserCreate, db: AsyncIOMotorDatabase = Depends(get_db)
 
 
 @app.post("/login", response_model=SessionInfo)
-async def login(payload: LoginRequest, db: AsyncIOMotorDatabase = Depends(get_db)) -> SessionInfo:
+async def login(
+    payload: LoginRequest,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    now: datetime = Depends(get_now),
+) -> SessionInfo:
     user = await db.users.find_one({"user_id": payload.user_id})
-    if not user or not verify_password(payload.password, user["password_hash"]):
+    if not user or not await verify_password(payload.password, user["password_hash"]):
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid credentials")
 
-    expires_at = datetime.utcnow() + timedelta(minutes=settings.session_ttl_minutes)
+    expires_at = now + timedelta(minutes=settings.session_ttl_minutes)
     session_id = str(uuid.uuid4())
     await db.sessions.insert_one(
         {
             "session_id": session_id,
             "user_id": user["user_id"],
-            "created_at": datetime.utcnow(),
+            "created_at": now,
             "expires_at": expires_at,
             "active": True,
         }
@@ -468,6 +718,7 @@ async def logout(
 ) -> None:
     session_id = getattr(request.state, "session_id", None)
     if session_id:
+        _session_cache.pop(session_id, None)
         await db.sessions.update_one({"session_id": session_id}, {"$set": {"active": False}})
 
 
@@ -476,7 +727,12 @@ async def logout(
 async def get_customer(
     user: dict = Depends(require_session), db: AsyncIOMotorDatabase = Depends(get_db)
 ) -> BankCustomer:
-    customer = await db.customers.find_one({"customer_id": user["customer_id"]})
+    if cached := _customer_cache.get(user["customer_id"]):
+        return BankCustomer(**cached["customer"])
+
+    customer = await db.customers.find_one(
+        {"customer_id": user["customer_id"]}, _CUSTOMER_OUT_PROJECTION
+    )
     if not customer:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Customer not found")
     return BankCustomer(**customer)
@@ -484,22 +740,36 @@ async def get_customer(
 
 @app.get("/me/accounts", response_model=list[AccountOut])
 async def list_accounts_for_user(
-    user: dict = Depends(require_session), db: AsyncIOMotorDatabase = Depends(get_db)
-) -> list[AccountOut]:
-    customer = await db.customers.find_one({"customer_id": user["customer_id"]})
-    if not customer:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Customer not found")
-    accounts = (
-        await db.accounts.find({"account_number": {"$in": customer.get("account_numbers", [])}})
-        .to_list(length=100)
+    fresh: bool = False,
+    user: dict = Depends(require_session),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+) -> Response:
+    # fresh=true skips the per-worker cache; used when balances will be read back to the user
+    cached = None if fresh else _customer_cache.get(user["customer_id"])
+    if cached:
+        accounts = cached["accounts"]
+    else:
+        customer = await db.customers.find_one(
+            {"customer_id": user["customer_id"]}, {"_id": 0, "account_numbers": 1}
+        )
+        if not customer:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "Customer not found")
+        accounts = (
+            await db.accounts.find(
+                {"account_number": {"$in": customer.get("account_numbers", [])}}, _ACCOUNT_OUT_PROJECTION
+            )
+            .to_list(length=100)
+        )
+    return Response(
+        content=_accounts_adapter.dump_json(_accounts_adapter.validate_python(accounts)),
+        media_type="application/json",
     )
-    return [AccountOut(**acct) for acct in accounts]
 
 
 @app.post("/me/accounts", response_model=AccountOut, status_code=status.HTTP_201_CREATED)
 async def create_account(
     payload: AccountCreate,
-    user: dict = Depends(require_session),
+    user: dict = Depends(require_live_session),
     db: AsyncIOMotorDatabase = Depends(get_db),
 ) -> AccountOut:
     if await db.accounts.find_one({"account_number": payload.account_number}):
@@ -507,7 +777,7 @@ async def create_account(
 
     account_doc = payload.dict()
     account_doc["customer_id"] = user["customer_id"]
-    account_doc["transaction_pin_hash"] = hash_password(payload.tpin)
+    account_doc["transaction_pin_hash"] = await hash_pin(payload.tpin)
     account_doc.pop("tpin", None)
     await db.accounts.insert_one(account_doc)
 
@@ -516,6 +786,7 @@ async def create_account(
         {"$addToSet": {"account_numbers": payload.account_number}},
         upsert=True,
     )
+    _customer_cache.pop(user["customer_id"], None)
     return AccountOut(**account_doc)
 
 
@@ -526,7 +797,8 @@ async def get_account(
     db: AsyncIOMotorDatabase = Depends(get_db),
 ) -> AccountOut:
     account = await db.accounts.find_one(
-        {"account_number": account_number, "customer_id": user["customer_id"]}
+        {"account_number": account_number, "customer_id": user["customer_id"]},
+        _ACCOUNT_OUT_PROJECTION,
     )
     if not account:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Account not found")
@@ -541,13 +813,13 @@ async def list_transactions(
     counterparty: str | None = None,
     user: dict = Depends(require_session),
     db: AsyncIOMotorDatabase = Depends(get_db),
-) -> list[TransactionOut]:
+) -> Response:
     if limit <= 0:
         limit = 3
 
     # ensure account belongs to caller
     account = await db.accounts.find_one(
-        {"account_number": account_number, "customer_id": user["customer_id"]}
+        {"account_number": account_number, "customer_id": user["customer_id"]}, {"_id": 1}
     )
     if not account:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Account not found")
@@ -559,68 +831,62 @@ async def list_transactions(
         query["counterparty"] = counterparty
 
     docs = (
-        await db.transactions.find(query).sort("created_at", -1).limit(limit).to_list(length=limit)
+        await db.transactions.find(query, _TRANSACTION_OUT_PROJECTION)
+        .hint("account_createdAt")
+        .sort("created_at", -1)
+        .limit(limit)
+        .to_list(length=limit)
     )
-    return [TransactionOut(**doc) for doc in docs]
-
-
-@app.post("/me/transfers", response_model=TransferResult)
-async def transfer_funds(
-    payload: TransferRequest,
-    user: dict = Depends(require_session),
-    db: AsyncIOMotorDatabase = Depends(get_db),
-) -> TransferResult:
-    # Ensure source account belongs to caller
-    source = await db.accounts.find_one(
-        {"account_number": payload.source_account_number, "customer_id": user["customer_id"]}
+    return Response(
+        content=_transactions_adapter.dump_json(_transactions_adapter.validate_python(docs)),
+        media_type="application/json",
     )
-    if not source:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Source account not found")
-    if not source.get("transaction_pin_hash"):
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Source account is missing a transaction PIN")
-    if not verify_password(payload.tpin, source["transaction_pin_hash"]):
-        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid transaction PIN")
 
-    # Ensure payee account exists (can belong to any customer)
-    payee = await db.accounts.find_one({"account_number": payload.payee_account_number})
-    if not payee:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, "Payee account not found")
-
-    if payload.amount <= 0:
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Amount must be greater than zero")
 
+async def _apply_transfer(
+    db: AsyncIOMotorDatabase,
+    payload: TransferRequest,
+    user: dict,
+    now: datetime,
+    session: AsyncIOMotorClientSession | None = None,
+) -> tuple[dict, dict]:
+    """Debit, credit and record a transfer; returns the updated source and payee accounts.
+
+    With a session the caller's transaction rolls everything back on failure;
+    without one a failed credit is refunded by hand.
+    """
     # Debit with balance guard
-    debit_res = await db.accounts.update_one(
+    updated_source = await db.accounts.find_one_and_update(
         {
             "account_number": payload.source_account_number,
             "customer_id": user["customer_id"],
             "balance": {"$gte": payload.amount},
         },
         {"$inc": {"balance": -payload.amount}},
+        projection={"_id": 0, "balance": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session,
     )
-    if debit_res.modified_count == 0:
+    if not updated_source:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, "Insufficient funds")
 
-    # Credit payee; if it fails, refund the debit
-    credit_res = await db.accounts.update_one(
+    # Credit payee; without a transaction, refund the debit if it fails
+    updated_payee = await db.accounts.find_one_and_update(
         {"account_number": payload.payee_account_number},
         {"$inc": {"balance": payload.amount}},
+        projection={"_id": 0, "balance": 1, "customer_id": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session,
     )
-    if credit_res.modified_count == 0:
-        await db.accounts.update_one(
-            {"account_number": payload.source_account_number, "customer_id": user["customer_id"]},
-            {"$inc": {"balance": payload.amount}},
-        )
+    if not updated_payee:
+        if session is None:
+            await db.accounts.update_one(
+                {"account_number": payload.source_account_number, "customer_id": user["customer_id"]},
+                {"$inc": {"balance": payload.amount}},
+            )
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, "Failed to credit payee")
 
-    # Fetch updated source balance for confirmation
-    updated_source = await db.accounts.find_one(
-        {"account_number": payload.source_account_number, "customer_id": user["customer_id"]}
-    )
-    updated_payee = await db.accounts.find_one({"account_number": payload.payee_account_number})
-
     # Record transactions for both sides
-    now = datetime.utcnow()
     source_txn = {
         "transaction_id": str(uuid.uuid4()),
         "account_number": payload.source_account_number,
@@ -630,7 +896,7 @@ async def transfer_funds(
         "counterparty_account": payload.payee_account_number[-4:],
         "description": f"Transfer to {payload.payee_name or 'payee'}",
         "created_at": now,
-        "balance_after": updated_source.get("balance") if updated_source else None,
+        "balance_after": updated_source.get("balance"),
         "customer_id": user["customer_id"],
     }
     payee_txn = {
@@ -642,15 +908,95 @@ async def transfer_funds(
         "counterparty_account": payload.source_account_number[-4:],
         "description": f"Transfer from {user.get('name')}",
         "created_at": now,
-        "balance_after": updated_payee.get("balance") if updated_payee else None,
-        "customer_id": updated_payee.get("customer_id") if updated_payee else None,
+        "balance_after": updated_payee.get("balance"),
+        "customer_id": updated_payee.get("customer_id"),
     }
     try:
-        await db.transactions.insert_many([source_txn, payee_txn])
-    except Exception:
+        await db.transactions.insert_many([source_txn, payee_txn], session=session)
+    except Exception as exc:
+        if (
+            session is not None
+            and isinstance(exc, PyMongoError)
+            and exc.has_error_label("TransientTransactionError")
+        ):
+            # Let with_transaction retry the whole transfer (e.g. on a write conflict)
+            raise
         logger.exception("Failed to record transaction entries")
+        if session is not None:
+            raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, "Transfer failed; no money was moved")
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, "Transfer recorded but logging failed")
 
+    return updated_source, updated_payee
+
+
+# Flipped off the first time the server rejects transactions (standalone mongod)
+_transactions_supported = True
+
+
+@app.post("/me/transfers", response_model=TransferResult)
+async def transfer_funds(
+    payload: TransferRequest,
+    background_tasks: BackgroundTasks,
+    user: dict = Depends(require_live_session),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    now: datetime = Depends(get_now),
+) -> TransferResult:
+    global _transactions_supported
+
+    # Source must belong to the caller; payee can belong to any customer.
+    # The lookups are independent, so issue them together.
+    source, payee = await asyncio.gather(
+        db.accounts.find_one(
+            {"account_number": payload.source_account_number, "customer_id": user["customer_id"]},
+            {"_id": 0, "balance": 1, "transaction_pin_hash": 1, "nickname": 1, "customer_id": 1},
+        ),
+        db.accounts.find_one(
+            {"account_number": payload.payee_account_number},
+            {"_id": 0, "balance": 1, "customer_id": 1, "nickname": 1},
+        ),
+    )
+    if not source:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Source account not found")
+    if not source.get("transaction_pin_hash"):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Source account is missing a transaction PIN")
+    if not await verify_pin(payload.tpin, source["transaction_pin_hash"]):
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid transaction PIN")
+    if pin_needs_rehash(source["transaction_pin_hash"]):
+        background_tasks.add_task(
+            _upgrade_pin_hash,
+            db,
+            payload.source_account_number,
+            source["transaction_pin_hash"],
+            payload.tpin,
+        )
+    if not payee:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Payee account not found")
+
+    if payload.amount <= 0:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Amount must be greater than zero")
+
+    updated = None
+    if _transactions_supported:
+        try:
+            async with await db.client.start_session() as session:
+                # with_transaction retries on transient errors such as write conflicts
+                updated = await session.with_transaction(
+                    lambda s: _apply_transfer(db, payload, user, now, session=s)
+                )
+        except OperationFailure as exc:
+            # IllegalOperation: transactions need a replica set or mongos
+            if exc.code != 20:
+                raise
+            logger.warning("MongoDB transactions unavailable; using non-transactional transfers")
+            _transactions_supported = False
+    if updated is None:
+        updated = await _apply_transfer(db, payload, user, now)
+    updated_source, updated_payee = updated
+
+    # Balances moved on both sides; drop any prefetched copies
+    _customer_cache.pop(user["customer_id"], None)
+    _customer_cache.pop(updated_payee.get("customer_id"), None)
+
     return TransferResult(
         status="success",
         amount=payload.amount,
@@ -659,5 +1005,22 @@ async def transfer_funds(
         payee_last4=str(payload.payee_account_number)[-4:],
         source_nickname=source.get("nickname"),
         payee_nickname=payee.get("nickname"),
-        new_source_balance=updated_source.get("balance") if updated_source else None,
+        new_source_balance=updated_source.get("balance"),
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    workers = int(os.environ.get("BANK_API_WORKERS", os.cpu_count() or 1))
+    # Spawned workers inherit the environment; export the count so each sizes _pin_slots to its share
+    os.environ["BANK_API_WORKERS"] = str(workers)
+    # uvloop/httptools ship with uvicorn[standard]; caches above are per worker
+    uvicorn.run(
+        "bank_api:app",
+        host=os.environ.get("BANK_API_HOST", "0.0.0.0"),
+        port=int(os.environ.get("BANK_API_PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+        workers=workers,
     )
@@ -1,15 +1,18 @@
-from datetime import datetime
+from datetime import date
+from functools import lru_cache
 
-current_time = datetime.now()
-formatted_time = current_time.strftime("%A, %d %B %Y at %I:%M %p %Z")
 
-AGENT_INSTRUCTIONS = f"""
+@lru_cache(maxsize=1)
+def get_agent_instructions(date_key: str) -> str:
+    """Build the agent prompt for a given ISO date; cached so it is rebuilt once a day."""
+    formatted_date = date.fromisoformat(date_key).strftime("%A, %d %B %Y")
+    return f"""
 
 # Role
 You are Anika, a female AI Voice Banking Assistant for Indian customers. You speak English, Hindi, or Hinglish based on the user and code-switch naturally.
 
 # Time context
-Today is {formatted_time}. Use it only when it helps the user.
+Today is {formatted_date}. Use it only when it helps the user.
 
 # Tone & Language
 - Friendly, concise, clear; no emojis or markdown.
@@ -1,10 +1,14 @@
-import json
+import asyncio
 import logging
+import math
 import os
-from dataclasses import dataclass
+import time
+from contextvars import ContextVar
+from functools import lru_cache
 from typing import Any, Dict, List, Literal, Optional
 
 import httpx
+import orjson
 from dotenv import load_dotenv
 from livekit.agents import RunContext, ToolError, function_tool, get_job_context
 
@@ -16,46 +20,61 @@ BANK_API_BASE_URL = os.environ.get("BANK_API_BASE_URL", "http://localhost:8000")
 logger = logging.getLogger("tools")
 
 
-@dataclass
-class MaskedAccount:
-    id: str
-    last4: str
-    nickname: str
-    type: Literal["Salary", "Savings", "Current"]
-    balance: Optional[float] = None
+def _session_id_from_metadata(meta: Optional[str]) -> Optional[str]:
+    """Pull "session_id" out of a metadata string, skipping the parse when it can't be there."""
+    if not meta or '"session_id"' not in meta:
+        return None
+    try:
+        return orjson.loads(meta).get("session_id")
+    except (orjson.JSONDecodeError, AttributeError):
+        logger.debug("Could not parse metadata for session_id")
+        return None
+
+
+# (participant, the metadata string it came from, session_id). Only valid while that exact
+# participant object is in the room with unchanged metadata: the room name is fixed per user,
+# so a re-login joins the same room as a new participant carrying a new session id.
+_SessionBinding = tuple[Any, Optional[str], str]
+
+
+def _binding_is_live(room, binding: _SessionBinding) -> bool:
+    participant, meta, _ = binding
+    return (
+        room.remote_participants.get(participant.identity) is participant
+        and participant.metadata == meta
+    )
+
+
+def _participant_session(room) -> Optional[_SessionBinding]:
+    """Session id from the first remote participant whose metadata carries one."""
+    for participant in room.remote_participants.values():
+        meta = getattr(participant, "metadata", None)
+        if session_id := _session_id_from_metadata(meta):
+            return participant, meta, session_id
+    return None
 
 
-def _resolve_session_id() -> str:
+def _resolve_session_id(room) -> str:
     """
     Find the current user's session id so every bank API call is tied to it.
     Sources (in order):
       1) remote participant metadata JSON with "session_id"
       2) room metadata JSON with "session_id"
       3) env BANK_API_SESSION_ID (fallback for local testing)
+    A participant hit is cached on the room until that participant leaves or reconnects.
     """
-    job_ctx = get_job_context()
-    room = job_ctx.room
+    binding = getattr(room, "_cached_session", None)
+    if binding is not None and _binding_is_live(room, binding):
+        return binding[2]
 
     # Check participant metadata first
-    for participant in room.remote_participants.values():
-        meta = getattr(participant, "metadata", None)
-        if meta:
-            try:
-                meta_json = json.loads(meta)
-                if session_id := meta_json.get("session_id"):
-                    return session_id
-            except Exception:
-                logger.debug("Could not parse participant metadata for session_id")
+    if binding := _participant_session(room):
+        room._cached_session = binding
+        return binding[2]
 
     # Then room metadata
-    meta = getattr(room, "metadata", None)
-    if meta:
-        try:
-            meta_json = json.loads(meta)
-            if session_id := meta_json.get("session_id"):
-                return session_id
-        except Exception:
-            logger.debug("Could not parse room metadata for session_id")
+    if session_id := _session_id_from_metadata(getattr(room, "metadata", None)):
+        return session_id
 
     # Fallback for local testing
     if env_session := os.environ.get("BANK_API_SESSION_ID"):
@@ -64,8 +83,161 @@ def _resolve_session_id() -> str:
     raise ToolError("Session ID missing; cannot call banking API securely.")
 
 
-def _http_client() -> httpx.AsyncClient:
-    return httpx.AsyncClient(base_url=BANK_API_BASE_URL, timeout=5.0)
+# Bound once by the agent entrypoint; tool tasks created afterwards inherit the value
+SESSION_ID_VAR: ContextVar[_SessionBinding] = ContextVar("session_id")
+
+
+def bind_session_id() -> None:
+    """Resolve the user's session id once at agent start so tools skip the metadata lookup."""
+    if binding := _participant_session(get_job_context().room):
+        SESSION_ID_VAR.set(binding)
+    else:
+        logger.warning("No participant session id at agent start; tools will resolve it per call")
+
+
+def _session_id() -> str:
+    room = get_job_context().room
+    binding = SESSION_ID_VAR.get(None)
+    if binding is not None and _binding_is_live(room, binding):
+        return binding[2]
+    return _resolve_session_id(room)
+
+
+@lru_cache(maxsize=256)
+def _session_headers(session_id: str, json_body: bool = False) -> Dict[str, str]:
+    """Banking API headers for a session, built once and shared by every call; do not mutate."""
+    if json_body:
+        return {"X-Session-Id": session_id, "Content-Type": "application/json"}
+    return {"X-Session-Id": session_id}
+
+
+def _user_participant(room):
+    """
+    Return the user's participant in this 1:1 room, cached on the room.
+    The cache is dropped once that participant leaves or reconnects.
+    """
+    participant = getattr(room, "_cached_user_participant", None)
+    if participant is not None and room.remote_participants.get(participant.identity) is participant:
+        return participant
+    try:
+        participant = next(iter(room.remote_participants.values()))
+    except StopIteration:
+        raise ToolError("No active participants found in the room")
+    room._cached_user_participant = participant
+    return participant
+
+
+_CLIENT: Optional[httpx.AsyncClient] = None
+_CLIENT_LOCK = asyncio.Lock()
+
+
+async def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared banking API client, creating it on first use.
+    Keeping one pooled client lets tool calls reuse open connections instead of
+    paying a new TCP handshake each time.
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        async with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = httpx.AsyncClient(
+                    base_url=BANK_API_BASE_URL,
+                    # HTTP/2 is negotiated over TLS; a plain-http (local uvicorn) API stays on HTTP/1.1
+                    http2=BANK_API_BASE_URL.startswith("https://"),
+                    timeout=httpx.Timeout(5.0),
+                    limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+                )
+    return _CLIENT
+
+
+# session_id -> (fetched_at, accounts by account number, masked accounts)
+_ACCOUNTS_CACHE: Dict[str, tuple[float, Dict[str, Dict[str, Any]], List[Dict[str, Any]]]] = {}
+_ACCOUNTS_TTL_SECONDS = 30.0
+_FRESH_PARAMS = {"fresh": "true"}
+
+
+async def _get_accounts(
+    session_id: str, fresh: bool = False
+) -> tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Return the user's accounts from /me/accounts as (raw accounts keyed by account
+    number, masked accounts for the picker). Both are cached for 30 seconds so
+    back-to-back tools in a conversation skip the round-trip and the re-masking.
+    Pass fresh=True when the balances will be read out: it bypasses this cache and
+    the API's own, so the balances come straight from Mongo.
+    """
+    cached = None if fresh else _ACCOUNTS_CACHE.get(session_id)
+    if cached and time.monotonic() - cached[0] < _ACCOUNTS_TTL_SECONDS:
+        return cached[1], cached[2]
+
+    client = await get_client()
+    resp = await client.get(
+        "/me/accounts", headers=_session_headers(session_id), params=_FRESH_PARAMS if fresh else None
+    )
+    if resp.status_code != 200:
+        logger.error("loading accounts failed: %s", resp.text)
+        raise ToolError("Unable to load your accounts right now.")
+    accounts = _json(resp)
+    raw_by_id = {acct["account_number"]: acct for acct in accounts}
+    masked = _mask_accounts(accounts)
+    _ACCOUNTS_CACHE[session_id] = (time.monotonic(), raw_by_id, masked)
+    return raw_by_id, masked
+
+
+# RPC methods implemented by the app (components/app/session-view.tsx)
+_RPC_CHOOSE_ACCOUNT = "chooseAccount"
+_RPC_REQUEST_TPIN = "requestTpin"
+_RPC_REQUEST_PAYEE = "requestPayeeAccNo"
+
+# chooseAccount RPC payloads; the masked account list is spliced in as JSON bytes
+_RPC_CHOOSE_TMPL = b'{"accounts":%b}'
+_RPC_CHOOSE_TMPL_TXN = b'{"accounts":%b,"prompt":"Choose account to review transactions"}'
+_RPC_CHOOSE_TMPL_SRC = b'{"accounts":%b,"prompt":"Choose the source account"}'
+
+
+def _mask_accounts(acct_list: list) -> List[Dict[str, Any]]:
+    """Project API accounts to the masked shape sent to the app's account picker."""
+    _get = dict.get
+    return [
+        {
+            "id": (acct_number := acct["account_number"]),
+            "nickname": _get(acct, "nickname", ""),
+            "type": _get(acct, "account_type", "Savings"),
+            "last4": acct_number[-4:],
+        }
+        for acct in acct_list
+    ]
+
+
+async def aclose_client() -> None:
+    """Close the shared client; registered as a job shutdown callback."""
+    global _CLIENT
+    if _CLIENT is not None:
+        client, _CLIENT = _CLIENT, None
+        await client.aclose()
+
+
+def _json(resp: httpx.Response) -> Any:
+    """Decode a successful banking API response body."""
+    return orjson.loads(resp.content)
+
+
+def _extract(resp: httpx.Response, *keys: str) -> tuple:
+    """Decode a response object and return only the given top-level keys, None when absent."""
+    return tuple(map(orjson.loads(resp.content).get, keys))
+
+
+def _raise_if_error(resp: httpx.Response, action: str) -> None:
+    """Raise a ToolError carrying the API's error detail when the call did not succeed."""
+    if resp.status_code == 200:
+        return
+    try:
+        body = orjson.loads(resp.content)
+        message = body.get("detail") or body.get("message") or resp.text
+    except (orjson.JSONDecodeError, AttributeError):
+        message = resp.text
+    raise ToolError(f"{action}: {message}")
 
 
 @function_tool()
@@ -73,27 +245,9 @@ async def list_accounts(context: RunContext) -> List[Dict[str, Any]]:
     """
     List the user's accounts in masked form using the banking API.
     """
-    session_id = _resolve_session_id()
-    async with _http_client() as client:
-        resp = await client.get("/me/accounts", headers={"X-Session-Id": session_id})
-    if resp.status_code != 200:
-        logger.error("list_accounts failed: %s", resp.text)
-        raise ToolError("Unable to load accounts right now.")
-
-    accounts = resp.json()
-    masked_accounts: List[Dict[str, Any]] = []
-    for acct in accounts:
-        acct_number = acct.get("account_number", "")
-        masked_accounts.append(
-            MaskedAccount(
-                id=acct_number,
-                last4=acct_number[-4:],
-                nickname=acct.get("nickname", ""),
-                type=acct.get("account_type", "Savings"),
-                balance=None,
-            ).__dict__
-        )
-    return masked_accounts
+    session_id = _session_id()
+    _, masked_accounts = await _get_accounts(session_id)
+    return [{**acct, "balance": None} for acct in masked_accounts]
 
 
 @function_tool()
@@ -104,57 +258,49 @@ async def fetch_balance(context: RunContext) -> Dict[str, Any]:
     context.disallow_interruptions()
     job_ctx = get_job_context()
     room = job_ctx.room
-    session_id = _resolve_session_id()
+    session_id = _session_id()
 
-    # identify the user participant
-    try:
-        participant_identity = next(iter(room.remote_participants))
-    except StopIteration:
-        raise ToolError("No active user participant found in the room.")
+    ident = _user_participant(room).identity
+    perform = room.local_participant.perform_rpc
 
     # Load masked accounts from API
-    async with _http_client() as client:
-        resp = await client.get("/me/accounts", headers={"X-Session-Id": session_id})
-    if resp.status_code != 200:
-        logger.error("fetch_balance list step failed: %s", resp.text)
-        raise ToolError("Unable to load accounts right now.")
-    acct_list = resp.json()
-    masked_accounts = [
-        {
-            "id": acct["account_number"],
-            "nickname": acct.get("nickname", ""),
-            "type": acct.get("account_type", "Savings"),
-            "last4": acct["account_number"][-4:],
-        }
-        for acct in acct_list
-    ]
+    _, masked_accounts = await _get_accounts(session_id)
+
+    payload = (_RPC_CHOOSE_TMPL % orjson.dumps(masked_accounts)).decode()
 
-    payload = json.dumps({"accounts": masked_accounts})
+    # The list already carries balances; re-read it from Mongo (bypassing both caches)
+    # while the user picks, so there is no second round-trip afterwards
+    refresh_task = asyncio.create_task(_get_accounts(session_id, fresh=True))
 
     try:
-        response = await room.local_participant.perform_rpc(
-            destination_identity=participant_identity,
-            method="chooseAccount",
+        response = await perform(
+            destination_identity=ident,
+            method=_RPC_CHOOSE_ACCOUNT,
             payload=payload,
             response_timeout=60.0,
         )
     except Exception as e:
+        refresh_task.cancel()
         logger.exception("RPC chooseAccount failed")
         raise ToolError("Unable to get account selection from the app.")
 
     try:
-        data = json.loads(response)
+        data = orjson.loads(response)
         account_id = data["accountId"]
     except Exception:
+        refresh_task.cancel()
         raise ToolError("Invalid account selection response from the app.")
 
-    async with _http_client() as client:
-        resp = await client.get(f"/me/accounts/{account_id}", headers={"X-Session-Id": session_id})
-    if resp.status_code != 200:
-        logger.error("fetch_balance detail step failed: %s", resp.text)
+    if account_id == -1:
+        refresh_task.cancel()
+        raise ToolError("Cancelled the balance check.")
+
+    accounts_by_id, _ = await refresh_task
+    account = accounts_by_id.get(account_id)
+    if account is None:
+        logger.error("fetch_balance: selected account %s not in account list", account_id)
         raise ToolError("Unable to fetch that account right now.")
 
-    account = resp.json()
     acct_number = account.get("account_number", "")
     return {
         "nickname": account.get("nickname", ""),
@@ -182,40 +328,25 @@ async def list_recent_transactions(
     ctx.disallow_interruptions()
     job_ctx = get_job_context()
     room = job_ctx.room
-    session_id = _resolve_session_id()
+    session_id = _session_id()
 
-    try:
-        user_participant = next(iter(room.remote_participants.values()))
-    except Exception:
-        raise ToolError("No active participants found in the room")
+    ident = _user_participant(room).identity
+    perform = room.local_participant.perform_rpc
 
-    async with _http_client() as client:
-        acct_resp = await client.get("/me/accounts", headers={"X-Session-Id": session_id})
-    if acct_resp.status_code != 200:
-        raise ToolError("Unable to load your accounts right now.")
-    acct_list = acct_resp.json()
-    masked_accounts = [
-        {
-            "id": acct["account_number"],
-            "nickname": acct.get("nickname", ""),
-            "type": acct.get("account_type", "Savings"),
-            "last4": acct["account_number"][-4:],
-        }
-        for acct in acct_list
-    ]
+    _, masked_accounts = await _get_accounts(session_id)
 
     try:
-        source_resp = await room.local_participant.perform_rpc(
-            destination_identity=user_participant.identity,
-            method="chooseAccount",
-            payload=json.dumps({"accounts": masked_accounts, "prompt": "Choose account to review transactions"}),
+        source_resp = await perform(
+            destination_identity=ident,
+            method=_RPC_CHOOSE_ACCOUNT,
+            payload=(_RPC_CHOOSE_TMPL_TXN % orjson.dumps(masked_accounts)).decode(),
             response_timeout=60.0,
         )
     except Exception:
         raise ToolError("I couldn't get the account selection.")
 
     try:
-        source_data = json.loads(source_resp)
+        source_data = orjson.loads(source_resp)
         account_id = source_data["accountId"]
     except Exception:
         raise ToolError("Invalid account selection.")
@@ -227,18 +358,27 @@ async def list_recent_transactions(
     if counterparty:
         params["counterparty"] = counterparty
 
-    async with _http_client() as client:
-        resp = await client.get(
-            f"/me/accounts/{account_id}/transactions", headers={"X-Session-Id": session_id}, params=params
-        )
-    if resp.status_code != 200:
-        try:
-            message = resp.json().get("detail", resp.text)
-        except Exception:
-            message = resp.text
-        raise ToolError(f"Unable to fetch transactions: {message}")
+    client = await get_client()
+    resp = await client.get(
+        f"/me/accounts/{account_id}/transactions", headers=_session_headers(session_id), params=params
+    )
+    _raise_if_error(resp, "Unable to fetch transactions")
 
-    transactions = resp.json()
+    # Keep only what the assistant reads out; ids and the account number are noise for the LLM.
+    # counterparty_account is already stored as the last 4 digits ("account ending XXXX").
+    _get = dict.get
+    transactions = [
+        {
+            "direction": txn["direction"],
+            "amount": txn["amount"],
+            "counterparty": _get(txn, "counterparty"),
+            "counterparty_account": _get(txn, "counterparty_account"),
+            "description": _get(txn, "description"),
+            "created_at": txn["created_at"],
+            "balance_after": _get(txn, "balance_after"),
+        }
+        for txn in _json(resp)
+    ]
     return {
         "account_id": account_id,
         "count": len(transactions),
@@ -248,6 +388,35 @@ async def list_recent_transactions(
         "transactions": transactions,
     }
 
+async def _request_tpin(perform, ident: str) -> Any:
+    """Ask the app for the transaction PIN and return the raw "tpin" value it sends back."""
+    try:
+        tpin_resp = await perform(
+            destination_identity=ident,
+            method=_RPC_REQUEST_TPIN,
+            payload="Enter your 4-digit transaction PIN",
+            response_timeout=60.0,
+        )
+        return orjson.loads(tpin_resp).get("tpin", "")
+    except Exception:
+        raise ToolError("I couldn't receive the transaction PIN.")
+
+
+async def _preflight_balance(session_id: str, account_number: str) -> Optional[float]:
+    """
+    Best-effort fresh balance of the source account; None when it can't be loaded,
+    leaving the bank API's own funds check to decide.
+    """
+    try:
+        accounts_by_id, _ = await _get_accounts(session_id, fresh=True)
+    except Exception:
+        # Anything escaping here would make the TaskGroup cancel the PIN prompt
+        logger.warning("transfer balance preflight failed", exc_info=True)
+        return None
+    account = accounts_by_id.get(account_number)
+    return account.get("balance") if account else None
+
+
 @function_tool()
 async def initiate_transfer(ctx: RunContext, amount: float, payee_nickname: Optional[str] = "") -> Dict[str, Any]:
     """
@@ -263,57 +432,46 @@ async def initiate_transfer(ctx: RunContext, amount: float, payee_nickname: Opti
     job_context = get_job_context()
     room = job_context.room
 
-    try:
-        user_participant = next(iter(room.remote_participants.values()))
-    except:
-        raise ToolError("No active participants found in the room")
+    ident = _user_participant(room).identity
+    perform = room.local_participant.perform_rpc
 
-    session_id = _resolve_session_id()
+    session_id = _session_id()
+
+    # Load the source accounts while the user types the payee account number
+    accounts_task = asyncio.create_task(_get_accounts(session_id))
 
     # Get payee_acc_no by requesting payee account number from the user in the frontend
     try:
-        payee_acc_no_resp = await room.local_participant.perform_rpc(
-            destination_identity=user_participant.identity,
-            method="requestPayeeAccNo",
+        payee_acc_no_resp = await perform(
+            destination_identity=ident,
+            method=_RPC_REQUEST_PAYEE,
             payload=f"Please enter {payee_nickname}'s account number",
             response_timeout=60.0
         )
+        payee_acc_data = orjson.loads(payee_acc_no_resp)
+        payee_acc_no = payee_acc_data["accountNumber"]
     except Exception:
+        accounts_task.cancel()
         raise ToolError("I couldn't recieve the payee account number")
 
-    payee_acc_data = json.loads(payee_acc_no_resp)
-    payee_acc_no = payee_acc_data["accountNumber"]
-
     if payee_acc_no == -1:
+        accounts_task.cancel()
         raise ToolError("Cancelled the transaction")
 
     # Ask user to pick source account
-    async with _http_client() as client:
-        acct_resp = await client.get("/me/accounts", headers={"X-Session-Id": session_id})
-    if acct_resp.status_code != 200:
-        raise ToolError("Unable to load your accounts right now.")
-    acct_list = acct_resp.json()
-    masked_accounts = [
-        {
-            "id": acct["account_number"],
-            "nickname": acct.get("nickname", ""),
-            "type": acct.get("account_type", "Savings"),
-            "last4": acct["account_number"][-4:],
-        }
-        for acct in acct_list
-    ]
+    _, masked_accounts = await accounts_task
     try:
-        source_resp = await room.local_participant.perform_rpc(
-            destination_identity=user_participant.identity,
-            method="chooseAccount",
-            payload=json.dumps({"accounts": masked_accounts, "prompt": "Choose the source account"}),
+        source_resp = await perform(
+            destination_identity=ident,
+            method=_RPC_CHOOSE_ACCOUNT,
+            payload=(_RPC_CHOOSE_TMPL_SRC % orjson.dumps(masked_accounts)).decode(),
             response_timeout=60.0,
         )
     except Exception:
         raise ToolError("I couldn't get the source account selection.")
 
     try:
-        source_data = json.loads(source_resp)
+        source_data = orjson.loads(source_resp)
         source_account = source_data["accountId"]
     except Exception:
         raise ToolError("Invalid source account selection.")
@@ -321,49 +479,45 @@ async def initiate_transfer(ctx: RunContext, amount: float, payee_nickname: Opti
     if source_account == -1:
         raise ToolError("Cancelled the transaction")
 
-    # Request transaction PIN from frontend (never via voice)
+    # Request transaction PIN from frontend (never via voice), checking the source
+    # balance while the user types it
     try:
-        tpin_resp = await room.local_participant.perform_rpc(
-            destination_identity=user_participant.identity,
-            method="requestTpin",
-            payload="Enter your 4-digit transaction PIN",
-            response_timeout=60.0,
-        )
-        tpin_data = json.loads(tpin_resp)
-        tpin = str(tpin_data.get("tpin", "")).strip()
-        if len(tpin) != 4 or not tpin.isdigit():
-            raise ToolError("Invalid transaction PIN format.")
-    except ToolError:
-        raise
-    except Exception:
-        raise ToolError("I couldn't receive the transaction PIN.")
-    
-    if tpin == -1:
+        async with asyncio.TaskGroup() as tg:
+            tpin_task = tg.create_task(_request_tpin(perform, ident))
+            balance_task = tg.create_task(_preflight_balance(session_id, source_account))
+    except* ToolError as eg:
+        raise eg.exceptions[0]
+    raw_tpin = tpin_task.result()
+
+    # The app cancels with a numeric -1, so check before the value is stringified
+    if raw_tpin == -1:
         raise ToolError("Cancelled the transaction.")
+    tpin = str(raw_tpin).strip()
+    if not (len(tpin) == 4 and tpin.isdigit()):
+        raise ToolError("Invalid transaction PIN format.")
+
+    balance = balance_task.result()
+    if balance is not None and amount > balance:
+        raise ToolError("Insufficient funds in the selected account.")
 
     # Create a pending transfer
-    async with _http_client() as client:
-        resp = await client.post(
-            "/me/transfers",
-            json={
+    client = await get_client()
+    resp = await client.post(
+        "/me/transfers",
+        content=orjson.dumps(
+            {
                 "source_account_number": source_account,
                 "payee_account_number": payee_acc_no,
                 "payee_name": payee_nickname,
                 "amount": amount,
                 "tpin": tpin,
-            },
-            headers={"X-Session-Id": session_id},
-        )
+            }
+        ),
+        headers=_session_headers(session_id, json_body=True),
+    )
+    _raise_if_error(resp, "Transfer failed")
 
-    if resp.status_code != 200:
-        try:
-            body = resp.json()
-            message = body.get("detail") or body.get("message") or resp.text
-        except Exception:
-            message = resp.text
-        raise ToolError(f"Transfer failed: {message}")
-
-    result = resp.json()
+    result = _json(resp)
     return {
         "status": "success",
         "amount": result.get("amount"),
@@ -376,18 +530,24 @@ async def initiate_transfer(ctx: RunContext, amount: float, payee_nickname: Opti
     }
 
 
+# Static catalogue shared by every call; treat as read-only.
+_LOAN_OPTIONS: Dict[str, Any] = {
+    "products": [
+        {"name": "Home Loan", "interest_rate_annual_percent": 8.5, "tenure_range_months": [60, 360]},
+        {"name": "Personal Loan", "interest_rate_annual_percent": 12.9, "tenure_range_months": [12, 60]},
+        {"name": "Auto Loan", "interest_rate_annual_percent": 9.75, "tenure_range_months": [12, 84]},
+        {"name": "Education Loan", "interest_rate_annual_percent": 9.2, "tenure_range_months": [24, 120]},
+    ],
+    "currency": "INR",
+}
+
+
 @function_tool()
 async def list_loan_options(ctx: RunContext) -> Dict[str, Any]:
     """
     Provide hardcoded loan products with indicative interest rates.
     """
-    options = [
-        {"name": "Home Loan", "interest_rate_annual_percent": 8.5, "tenure_range_months": [60, 360]},
-        {"name": "Personal Loan", "interest_rate_annual_percent": 12.9, "tenure_range_months": [12, 60]},
-        {"name": "Auto Loan", "interest_rate_annual_percent": 9.75, "tenure_range_months": [12, 84]},
-        {"name": "Education Loan", "interest_rate_annual_percent": 9.2, "tenure_range_months": [24, 120]},
-    ]
-    return {"products": options, "currency": "INR"}
+    return _LOAN_OPTIONS
 
 
 @function_tool()
@@ -417,7 +577,8 @@ async def calculate_emi(
     if monthly_rate == 0:
         emi = principal / n
     else:
-        emi = principal * monthly_rate * (1 + monthly_rate) ** n / ((1 + monthly_rate) ** n - 1)
+        growth = math.expm1(n * math.log1p(monthly_rate))  # (1 + r)^n - 1
+        emi = principal * monthly_rate * (growth + 1.0) / growth
 
     total_payment = emi * n
     total_interest = total_payment - principal
@@ -439,15 +600,10 @@ async def get_user_name(ctx: RunContext) -> Dict[str, Any]:
     """
     Fetch the signed-in user's name from the banking API using the current session.
     """
-    session_id = _resolve_session_id()
-    async with _http_client() as client:
-        resp = await client.get("/me/customer", headers={"X-Session-Id": session_id})
-    if resp.status_code != 200:
-        try:
-            message = resp.json().get("detail", resp.text)
-        except Exception:
-            message = resp.text
-        raise ToolError(f"Unable to fetch your profile: {message}")
-
-    customer = resp.json()
-    return {"name": customer.get("name", ""), "customer_id": customer.get("customer_id")}
+    session_id = _session_id()
+    client = await get_client()
+    resp = await client.get("/me/customer", headers=_session_headers(session_id))
+    _raise_if_error(resp, "Unable to fetch your profile")
+
+    name, customer_id = _extract(resp, "name", "customer_id")
+    return {"name": name or "", "customer_id": customer_id}